@@ -2,21 +2,24 @@
 
 from pathlib import Path
 from anthropic import Anthropic
+import asyncio
+import hashlib
+import re
+import subprocess
+import tempfile
 import time
 import os
 import httpx
+from dbt_to_dataform.response_cache import get_cached_response, store_response
+from dbt_to_dataform.retry import backoff_delay
 
-class MacroConverter:
-    def __init__(self, anthropic_api_key):
-        # Set the API key as an environment variable as a fallback
-        os.environ["ANTHROPIC_API_KEY"] = anthropic_api_key
-        # Create a custom httpx client without proxies
-        http_client = httpx.Client(timeout=None, follow_redirects=True)
-        # Initialize the client with a custom httpx client
-        self.anthropic_client = Anthropic(api_key=anthropic_api_key, http_client=http_client)
-        self.model = "claude-3-7-sonnet-latest"
-        
-        self.system_prompt = """
+# Jinja-style macro calls left over from dbt, rewritten to JavaScript
+# interpolation; compiled once at import
+_JINJA_CALL_RE = re.compile(r'\{\{\s*(.*?)\s*\}\}', re.DOTALL)
+
+# Built once at import; every MacroConverter instance shares the same
+# conversion instructions instead of re-allocating them per instantiation
+_SYSTEM_PROMPT = """
         You are an expert in dbt (data build tool) and Dataform, specializing in converting dbt macros to JavaScript functions for Dataform.
         Your task is to convert dbt macros written in Jinja/SQL to JavaScript for use in Dataform.
         
@@ -103,64 +106,282 @@ class MacroConverter:
         Do not include any introductory text or explanations in your response - provide only the converted JavaScript function.
         """
 
+class MacroConverter:
+    def __init__(self, anthropic_api_key, anthropic_client=None):
+        # Set the API key as an environment variable as a fallback
+        os.environ["ANTHROPIC_API_KEY"] = anthropic_api_key
+        if anthropic_client is not None:
+            # Reuse the caller's client so all API calls in a run share one
+            # connection pool instead of paying TLS/DNS setup per component
+            self.anthropic_client = anthropic_client
+        else:
+            # Create a custom httpx client without proxies
+            http_client = httpx.Client(timeout=None, follow_redirects=True)
+            self.anthropic_client = Anthropic(api_key=anthropic_api_key, http_client=http_client)
+        # Macros are short, templated translations, so the first pass goes to
+        # Haiku; Sonnet is only used when the emitted JavaScript fails to parse
+        self.fast_model = "claude-haiku-4-5"
+        self.strong_model = "claude-3-7-sonnet-latest"
+        self.model = self.fast_model
+        # Seconds between polls while waiting for a Message Batch to finish
+        self.batch_poll_interval = 10
+        # (size, mtime) per file as of our last reference rewrite, so repeat
+        # passes can skip unchanged files without reading them
+        self._reference_update_stats = {}
+
+        self.system_prompt = _SYSTEM_PROMPT
+
     def convert_macros(self, dbt_project_path, dataform_output_path):
         macros_dir = Path(dbt_project_path) / 'macros'
         dataform_includes_dir = Path(dataform_output_path) / 'includes'
         dataform_includes_dir.mkdir(parents=True, exist_ok=True)
-        
+
         print(f"Scanning for macros in {macros_dir}...")
         if not macros_dir.exists():
             print(f"Warning: macros directory {macros_dir} not found. Skipping macro conversion.")
             return
-        
-        for macro_file in macros_dir.glob('*.sql'):
+
+        # Read all macro files up front so we can submit them as one batch
+        macro_contents = {}
+        for macro_file in sorted(macros_dir.glob('*.sql')):
             try:
-                print(f"Converting macro file: {macro_file.name}")
-                with open(macro_file, 'r') as f:
-                    macro_content = f.read()
+                macro_contents[macro_file.stem] = macro_file.read_text(encoding='utf-8')
+            except Exception as e:
+                print(f"Error reading macro {macro_file.name}: {str(e)}")
+
+        if not macro_contents:
+            print("No macro files found. Skipping macro conversion.")
+            return
 
+        # Projects often vendor the same macro in several sub-packages;
+        # convert each unique body once and fan the result out afterwards
+        duplicates = {}
+        representatives = {}
+        seen_digests = {}
+        for macro_name, macro_content in macro_contents.items():
+            digest = hashlib.blake2b(macro_content.encode(), digest_size=16).hexdigest()
+            if digest in seen_digests:
+                duplicates.setdefault(seen_digests[digest], []).append(macro_name)
+                print(f"Macro {macro_name}.sql is identical to {seen_digests[digest]}.sql. Converting once.")
+            else:
+                seen_digests[digest] = macro_name
+                representatives[macro_name] = macro_content
+
+        converted_names = self._convert_unique_macros(representatives, dataform_includes_dir)
+        self._fan_out_duplicates(duplicates, dataform_includes_dir, converted_names)
+
+    def _convert_unique_macros(self, macro_contents, dataform_includes_dir):
+        """Convert each unique macro and return the set of names written."""
+        # Serve macros whose bytes are unchanged from a previous run straight
+        # from the on-disk response cache
+        converted_names = set()
+        uncached_contents = {}
+        for macro_name, macro_content in macro_contents.items():
+            cached_js = get_cached_response(self._conversion_cache_key(macro_content))
+            if cached_js and cached_js.strip():
+                output_file = dataform_includes_dir / f"{macro_name}.js"
+                output_file.write_text(cached_js.strip(), encoding='utf-8')
+                converted_names.add(macro_name)
+                print(f"✓ Converted {macro_name}.sql from cache")
+            else:
+                uncached_contents[macro_name] = macro_content
+        macro_contents = uncached_contents
+
+        if not macro_contents:
+            print("All macros served from cache.")
+            return converted_names
+
+        if len(macro_contents) == 1:
+            # A batch of one gains nothing; use the direct call
+            converted_names |= self._convert_macros_individually(macro_contents, dataform_includes_dir)
+        else:
+            converted_names |= self._convert_macros_batch(macro_contents, dataform_includes_dir)
+        return converted_names
+
+    def _fan_out_duplicates(self, duplicates, dataform_includes_dir, converted_names):
+        for representative, duplicate_names in duplicates.items():
+            # Gate on what was written this run, not on file existence: a
+            # stale .js left by an earlier run must not mask a failed
+            # conversion of changed source bytes
+            if representative not in converted_names:
+                print(f"Warning: no conversion result for {representative}.sql; skipping its duplicates.")
+                continue
+            source_file = dataform_includes_dir / f"{representative}.js"
+            converted_js = source_file.read_text(encoding='utf-8')
+            for duplicate_name in duplicate_names:
+                output_file = dataform_includes_dir / f"{duplicate_name}.js"
+                output_file.write_text(converted_js, encoding='utf-8')
+                print(f"✓ Converted {duplicate_name}.sql (identical to {representative}.sql)")
+
+    def _convert_macros_individually(self, macro_contents, dataform_includes_dir):
+        converted_names = set()
+        for macro_name, macro_content in macro_contents.items():
+            try:
+                print(f"Converting macro file: {macro_name}.sql")
                 converted_js = self._convert_with_anthropic(macro_content)
-                
+
                 if not converted_js.strip():
-                    print(f"Warning: Empty conversion result for {macro_file.name}. Skipping.")
+                    print(f"Warning: Empty conversion result for {macro_name}.sql. Skipping.")
                     continue
 
-                output_file = dataform_includes_dir / f"{macro_file.stem}.js"
-                with open(output_file, 'w') as f:
-                    f.write(converted_js.strip())  # Remove any leading/trailing whitespace
+                output_file = dataform_includes_dir / f"{macro_name}.js"
+                # Remove any leading/trailing whitespace
+                output_file.write_text(converted_js.strip(), encoding='utf-8')
+                converted_names.add(macro_name)
 
-                print(f"✓ Successfully converted {macro_file.name} to {output_file.name}")
+                print(f"✓ Successfully converted {macro_name}.sql to {output_file.name}")
             except Exception as e:
-                print(f"Error converting macro {macro_file.name}: {str(e)}")
+                print(f"Error converting macro {macro_name}.sql: {str(e)}")
+        return converted_names
+
+    def _convert_macros_batch(self, macro_contents, dataform_includes_dir):
+        print(f"Submitting {len(macro_contents)} macros as a single Message Batch...")
+        batch_requests = [
+            {
+                "custom_id": macro_name,
+                "params": {
+                    "model": self.fast_model,
+                    "max_tokens": self._estimate_max_tokens(macro_content),
+                    # Batches can take longer than the default 5-minute cache
+                    # window, so pin the cached prompt for an hour
+                    "system": self._build_system_param(ttl="1h"),
+                    "messages": [
+                        {"role": "user", "content": self._build_user_prompt(macro_content)}
+                    ],
+                    "temperature": 0.2
+                }
+            }
+            for macro_name, macro_content in macro_contents.items()
+        ]
+
+        try:
+            batch = self.anthropic_client.messages.batches.create(requests=batch_requests)
+        except Exception as e:
+            print(f"Error submitting macro batch: {str(e)}. Falling back to individual conversion.")
+            return self._convert_macros_individually(macro_contents, dataform_includes_dir)
+
+        print(f"Batch {batch.id} submitted. Waiting for processing to finish...")
+        while batch.processing_status != "ended":
+            time.sleep(self.batch_poll_interval)
+            batch = self.anthropic_client.messages.batches.retrieve(batch.id)
+
+        converted_names = set()
+        for result in self.anthropic_client.messages.batches.results(batch.id):
+            macro_name = result.custom_id
+            if result.result.type != "succeeded":
+                print(f"Error converting macro {macro_name}.sql: batch result was '{result.result.type}'")
+                continue
 
-    def _convert_with_anthropic(self, macro_content, max_retries=3):
-        user_prompt = f"""
+            converted_js = result.result.message.content[0].text.strip()
+            if not converted_js:
+                print(f"Warning: Empty conversion result for {macro_name}.sql. Skipping.")
+                continue
+
+            try:
+                converted_js = self._escalate_if_invalid(converted_js, macro_contents[macro_name])
+                # Only cache once escalation has settled on an output; caching
+                # after a failed escalation would pin invalid JavaScript for
+                # every future run of an unchanged project
+                store_response(self._conversion_cache_key(macro_contents[macro_name]), converted_js)
+            except Exception as e:
+                print(f"Error escalating macro {macro_name}.sql to {self.strong_model}: {str(e)}")
+                print(f"Writing the unvalidated fast-model output for {macro_name}.sql without caching it.")
+
+            output_file = dataform_includes_dir / f"{macro_name}.js"
+            output_file.write_text(converted_js, encoding='utf-8')
+            converted_names.add(macro_name)
+
+            print(f"✓ Successfully converted {macro_name}.sql to {output_file.name}")
+        return converted_names
+
+    def _build_system_param(self, ttl=None):
+        # Mark the static system prompt as cacheable so every call after the
+        # first reuses the server-side prefix cache instead of re-prefilling it
+        cache_control = {"type": "ephemeral"}
+        if ttl:
+            cache_control["ttl"] = ttl
+        return [{"type": "text", "text": self.system_prompt, "cache_control": cache_control}]
+
+    def _build_user_prompt(self, macro_content):
+        return f"""
         Please convert this dbt macro to a JavaScript function for Dataform:
-        
+
         ```sql
         {macro_content}
         ```
         """
-        
+
+    def _estimate_max_tokens(self, macro_content):
+        # Anthropic reserves budget proportional to max_tokens, so asking for
+        # 64k tokens on a 50-line macro just inflates queue time. Scale the
+        # reservation with input size and only give very large files headroom.
+        return min(64000, max(4096, 4 * len(macro_content.split())))
+
+    def _conversion_cache_key(self, macro_content):
+        # Keyed on model and system prompt too, so prompt or model changes
+        # invalidate old entries
+        return (self.fast_model, self.system_prompt, macro_content)
+
+    def _convert_with_anthropic(self, macro_content, max_retries=6):
+        cached_js = get_cached_response(self._conversion_cache_key(macro_content))
+        if cached_js:
+            return cached_js
+
+        converted_js = self._request_conversion(macro_content, self.fast_model, self._estimate_max_tokens(macro_content), max_retries)
+        converted_js = self._escalate_if_invalid(converted_js, macro_content, max_retries)
+        if converted_js:
+            store_response(self._conversion_cache_key(macro_content), converted_js)
+        return converted_js
+
+    def _request_conversion(self, macro_content, model, max_tokens, max_retries=6):
+        user_prompt = self._build_user_prompt(macro_content)
+
         retry_count = 0
         while retry_count < max_retries:
             try:
-                response = self.anthropic_client.messages.create(
-                    model=self.model,
-                    max_tokens=64000,
-                    system=self.system_prompt,
+                # Stream the response so token decoding overlaps with
+                # accumulation instead of waiting for the full message
+                chunks = []
+                with self.anthropic_client.messages.stream(
+                    model=model,
+                    max_tokens=max_tokens,
+                    system=self._build_system_param(),
                     messages=[
                         {"role": "user", "content": user_prompt}
                     ],
                     temperature=0.2
-                )
-                return response.content[0].text.strip()
+                ) as stream:
+                    for text in stream.text_stream:
+                        chunks.append(text)
+                return ''.join(chunks).strip()
             except Exception as e:
                 retry_count += 1
                 if retry_count >= max_retries:
                     raise
-                print(f"API error: {str(e)}. Retrying in 2 seconds... (Attempt {retry_count}/{max_retries})")
-                time.sleep(2)
+                delay = backoff_delay(retry_count - 1, e)
+                print(f"API error: {str(e)}. Retrying in {delay:.1f} seconds... (Attempt {retry_count}/{max_retries})")
+                time.sleep(delay)
+
+    def _escalate_if_invalid(self, converted_js, macro_content, max_retries=6):
+        if converted_js and not self._is_valid_javascript(converted_js):
+            print(f"Fast-model output failed JavaScript validation. Retrying with {self.strong_model}...")
+            converted_js = self._request_conversion(macro_content, self.strong_model, 64000, max_retries)
+        return converted_js
+
+    def _is_valid_javascript(self, js_code):
+        try:
+            with tempfile.NamedTemporaryFile('w', suffix='.js', delete=False) as tmp:
+                tmp.write(js_code)
+                tmp_path = tmp.name
+            try:
+                result = subprocess.run(['node', '--check', tmp_path], capture_output=True, timeout=30)
+                return result.returncode == 0
+            finally:
+                os.unlink(tmp_path)
+        except (OSError, subprocess.SubprocessError):
+            # node isn't available (or the check itself failed to run), so we
+            # can't tell the output is broken; accept it rather than escalate
+            return True
 
     def update_macro_references(self, dataform_output_path: Path):
         definitions_dir = Path(dataform_output_path) / 'definitions'
@@ -170,36 +391,54 @@ class MacroConverter:
             
         print("Updating macro references in JavaScript files...")
         try:
-            # Look for both .js and .sqlx files
-            for file_path in definitions_dir.rglob('*.js'):
-                self._update_references_in_file(file_path)
-                
-            for file_path in definitions_dir.rglob('*.sqlx'):
-                self._update_references_in_file(file_path)
-                
+            asyncio.run(self._update_macro_references_async(definitions_dir))
         except Exception as e:
             print(f"Error updating macro references: {str(e)}")
-            
-    def _update_references_in_file(self, file_path):
+
+    async def _update_macro_references_async(self, definitions_dir: Path, max_concurrency: int = 32):
+        # Offload the directory walk so the event loop isn't blocked on
+        # syscalls; look for both .js and .sqlx files
+        file_paths = await asyncio.to_thread(
+            lambda: list(definitions_dir.rglob('*.js')) + list(definitions_dir.rglob('*.sqlx'))
+        )
+
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def _bounded_update(file_path):
+            async with semaphore:
+                await asyncio.to_thread(self._update_references_in_file, file_path)
+
+        await asyncio.gather(*[_bounded_update(file_path) for file_path in file_paths])
+
+    def update_references_in_content(self, file_path, content):
+        """Rewrite macro references for a file whose content is already in
+        memory, so the final directory-wide pass can skip re-reading it."""
+        self._update_references_in_file(file_path, content)
+
+    def _update_references_in_file(self, file_path, content=None):
         try:
-            with open(file_path, 'r') as f:
-                content = f.read()
+            if content is None:
+                stat = file_path.stat()
+                if self._reference_update_stats.get(file_path) == (stat.st_size, stat.st_mtime):
+                    # Untouched since our last rewrite; skip the read entirely
+                    return
 
-            # Update macro references from dbt to Dataform syntax
-            # More comprehensive than the basic replacement
-            updated_content = content
-            
-            # Replace dbt Jinja style macro calls with JavaScript
-            updated_content = updated_content.replace('{{ ', '${')
-            updated_content = updated_content.replace(' }}', '}')
-            
-            # Update macro calls within backticks
-            # This is more complex and might need further refinement
+                content = file_path.read_text(encoding='utf-8')
+
+            # Replace dbt Jinja style macro calls with JavaScript in a single
+            # pass; the regex also tolerates variable whitespace inside the
+            # delimiters that the old str.replace pair missed
+            updated_content = _JINJA_CALL_RE.sub(lambda m: '${' + m.group(1) + '}', content)
 
             if updated_content != content:
-                with open(file_path, 'w') as f:
-                    f.write(updated_content)
+                # Write to a sibling tempfile and swap it in atomically
+                tmp_path = file_path.with_suffix(file_path.suffix + '.tmp')
+                tmp_path.write_text(updated_content, encoding='utf-8')
+                os.replace(tmp_path, file_path)
                 print(f"Updated macro references in {file_path.name}")
-                
+
+            stat = file_path.stat()
+            self._reference_update_stats[file_path] = (stat.st_size, stat.st_mtime)
+
         except Exception as e:
             print(f"Error updating references in {file_path.name}: {str(e)}")
\ No newline at end of file
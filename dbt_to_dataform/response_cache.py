@@ -0,0 +1,41 @@
+# response_cache.py
+
+from pathlib import Path
+import hashlib
+import json
+import os
+
+# Exact-match, content-addressed cache of Claude responses. Conversion is
+# idempotent for identical input bytes, so unchanged files never pay for a
+# second API call across runs.
+CACHE_DIR = Path.home() / '.cache' / 'dbt_to_dataform' / 'responses'
+
+
+def _cache_path(key_parts) -> Path:
+    digest = hashlib.sha256('\x00'.join(key_parts).encode()).hexdigest()
+    return CACHE_DIR / f"{digest}.json"
+
+
+def get_cached_response(key_parts):
+    """Return the cached response text for key_parts, or None on a miss."""
+    cache_file = _cache_path(key_parts)
+    try:
+        if cache_file.exists():
+            with open(cache_file, 'r') as f:
+                return json.load(f)['text']
+    except (OSError, json.JSONDecodeError, KeyError) as e:
+        print(f"Warning: could not read response cache entry: {str(e)}")
+    return None
+
+
+def store_response(key_parts, text) -> None:
+    """Persist a response under key_parts, atomically via os.replace."""
+    cache_file = _cache_path(key_parts)
+    try:
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = cache_file.with_name(cache_file.name + '.tmp')
+        with open(tmp_file, 'w') as f:
+            json.dump({'text': text}, f)
+        os.replace(tmp_file, cache_file)
+    except OSError as e:
+        print(f"Warning: could not write response cache entry: {str(e)}")
@@ -0,0 +1,24 @@
+# retry.py
+
+import random
+
+# Base delay in seconds for the exponential backoff schedule
+BASE_DELAY = 0.5
+
+
+def backoff_delay(attempt: int, exception=None, base: float = BASE_DELAY) -> float:
+    """Seconds to sleep before retry number `attempt` (0-based).
+
+    Exponential backoff with jitter so parallel callers don't retry in
+    lockstep, never shorter than a server-provided Retry-After header.
+    """
+    retry_after = 0.0
+    response = getattr(exception, 'response', None)
+    if response is not None:
+        header = getattr(response, 'headers', {}).get('retry-after')
+        if header:
+            try:
+                retry_after = float(header)
+            except ValueError:
+                pass
+    return max(retry_after, base * (2 ** attempt) + random.uniform(0, 0.5 * base))
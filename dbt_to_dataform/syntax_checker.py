@@ -1,108 +1,18 @@
-import re
+import asyncio
+import functools
 import json
-from anthropic import Anthropic
+from anthropic import Anthropic, AsyncAnthropic
 import time
 from pathlib import Path
 import os
 import httpx
 from dbt_to_dataform.conversion_report import ConversionReport
+from dbt_to_dataform.response_cache import get_cached_response, store_response
+from dbt_to_dataform.retry import backoff_delay
 
-class SyntaxChecker:
-    def __init__(self, anthropic_api_key: str):
-        self.anthropic_api_key = anthropic_api_key
-        # Set the API key as an environment variable as a fallback
-        os.environ["ANTHROPIC_API_KEY"] = anthropic_api_key
-        # Create a custom httpx client without proxies
-        self.http_client = httpx.Client(timeout=None, follow_redirects=True)
-        # Initialize the client with a custom httpx client
-        self.anthropic_client = Anthropic(api_key=anthropic_api_key, http_client=self.http_client)
-        self.model = "claude-3-7-sonnet-latest"
-        
-    def check_and_correct_syntax(self, file_path: Path, content: str, conversion_report: ConversionReport) -> tuple:
-        print(f"Checking syntax for file: {file_path}")
-        
-        if not self.anthropic_api_key:
-            print("Anthropic API key not provided. Skipping syntax check.")
-            return content, None
-
-        if not isinstance(content, str):
-            print(f"Warning: content is not a string. Type: {type(content)}")
-            return str(content) if content is not None else "", None
-
-        file_type = self._get_file_type(file_path)
-        system_prompt = self._get_system_prompt(file_type)
-        user_prompt = self._get_user_prompt(file_type, content)
-
-        try:
-            print(f"Sending to Claude API for syntax checking...")
-            
-            response = self.anthropic_client.messages.create(
-                model=self.model,
-                max_tokens=64000,
-                system=system_prompt,
-                messages=[
-                    {"role": "user", "content": user_prompt}
-                ],
-                temperature=0.2
-            )
-            
-            result = response.content[0].text.strip()
-            print(f"Claude API response received for {file_path}")
-
-            if result.lower() != "valid":
-                conversion_report.add_issue(
-                    str(file_path),
-                    "Syntax Correction",
-                    f"The following changes were made: {result}"
-                )
-                print(f"Syntax corrections made for {file_path}")
-                corrected_code = self._extract_corrected_code(result, file_type)
-                return corrected_code if corrected_code else content, result
-            else:
-                print(f"No syntax corrections needed for {file_path}")
-            
-            return content, None
-
-        except Exception as e:
-            print(f"Claude API error during syntax check for {file_path}: {str(e)}")
-            # Attempt to retry once
-            try:
-                print("Retrying syntax check after 2 seconds...")
-                time.sleep(2)
-                
-                response = self.anthropic_client.messages.create(
-                    model=self.model,
-                    max_tokens=64000,
-                    system=system_prompt,
-                    messages=[
-                        {"role": "user", "content": user_prompt}
-                    ],
-                    temperature=0.2
-                )
-                
-                result = response.content[0].text.strip()
-                if result.lower() != "valid":
-                    corrected_code = self._extract_corrected_code(result, file_type)
-                    return corrected_code if corrected_code else content, result
-            except Exception as retry_error:
-                print(f"Retry also failed: {str(retry_error)}")
-                
-            return content, None
-        except Exception as e:
-            print(f"Unexpected error during syntax check for {file_path}: {str(e)}")
-            return content, None
-
-    def _get_file_type(self, file_path: Path) -> str:
-        if file_path.suffix == '.sqlx':
-            return 'sqlx'
-        elif file_path.name == 'dataform.json':
-            return 'json'
-        else:
-            return 'unknown'
-
-    def _get_system_prompt(self, file_type: str) -> str:
-        if file_type == 'sqlx':
-            return """
+# Built once at import; _get_system_prompt hands out references to these
+# instead of rebuilding the strings per call
+_SQLX_SYSTEM_PROMPT = """
             You are an expert in Dataform SQLX syntax and BigQuery SQL. Your task is to check and correct Dataform SQLX code.
             
             Dataform SQLX files are SQL files with JavaScript configuration blocks at the top. These files typically:
@@ -124,10 +34,13 @@ class SyntaxChecker:
             2. How you fixed it
             3. Why the correction is needed
             
-            If the code is valid, just respond with "Valid".
+            Always respond with a single JSON object and no surrounding prose or code fences:
+            {"status": "valid"} if the code is valid, or
+            {"status": "corrected", "code": "<full corrected code>", "explanation": "<what was wrong and how you fixed it>"} if it is not.
+            Put the "status" field first.
             """
-        elif file_type == 'json':
-            return """
+
+_JSON_SYSTEM_PROMPT = """
             You are an expert in Dataform configuration and JSON syntax. Your task is to check and correct Dataform JSON configuration files.
             
             Dataform's dataform.json file contains project configuration including:
@@ -147,95 +60,437 @@ class SyntaxChecker:
             2. How you fixed it
             3. Why the correction is needed
             
-            If the JSON is valid, just respond with "Valid".
+            Always respond with a single JSON object and no surrounding prose or code fences:
+            {"status": "valid"} if the configuration is valid, or
+            {"status": "corrected", "code": "<full corrected JSON>", "explanation": "<what was wrong and how you fixed it>"} if it is not.
+            Put the "status" field first.
             """
-        else:
-            return """
+
+_DEFAULT_SYSTEM_PROMPT = """
             You are an expert code reviewer. Your task is to check the provided code for syntax errors and other issues.
             
-            If the code appears valid, just respond with "Valid".
-            If you find issues, explain what's wrong and provide corrected code.
+            Always respond with a single JSON object and no surrounding prose or code fences:
+            {"status": "valid"} if the code appears valid, or
+            {"status": "corrected", "code": "<full corrected code>", "explanation": "<what was wrong and how you fixed it>"} if it is not.
+            Put the "status" field first.
             """
 
+class SyntaxChecker:
+    def __init__(self, anthropic_api_key: str, anthropic_client=None):
+        self.anthropic_api_key = anthropic_api_key
+        # Set the API key as an environment variable as a fallback
+        os.environ["ANTHROPIC_API_KEY"] = anthropic_api_key
+        if anthropic_client is not None:
+            # Reuse the caller's client so all API calls in a run share one
+            # connection pool instead of paying TLS/DNS setup per component
+            self.anthropic_client = anthropic_client
+        else:
+            # Create a custom httpx client without proxies
+            self.http_client = httpx.Client(timeout=None, follow_redirects=True)
+            self.anthropic_client = Anthropic(api_key=anthropic_api_key, http_client=self.http_client)
+        # Async client used when several files are checked concurrently
+        self.async_http_client = httpx.AsyncClient(timeout=None, follow_redirects=True)
+        self.async_client = AsyncAnthropic(api_key=anthropic_api_key, http_client=self.async_http_client)
+        self.model = "claude-3-7-sonnet-latest"
+        # Total attempts per check; delays grow exponentially, so the
+        # worst-case wait stays bounded
+        self.max_retries = 6
+        # Seconds between polls while waiting for a Message Batch to finish
+        self.batch_poll_interval = 10
+        # Files queued by enqueue() for the batched check in flush()
+        self._pending = []
+
+    def check_and_correct_syntax(self, file_path: Path, content: str, conversion_report: ConversionReport) -> tuple:
+        print(f"Checking syntax for file: {file_path}")
+        
+        if not self.anthropic_api_key:
+            print("Anthropic API key not provided. Skipping syntax check.")
+            return content, None
+
+        if not isinstance(content, str):
+            print(f"Warning: content is not a string. Type: {type(content)}")
+            return str(content) if content is not None else "", None
+
+        file_type = self._get_file_type(file_path)
+        system_prompt = self._get_system_prompt(file_type)
+        user_prompt = self._get_user_prompt(file_type, content)
+
+        if self._local_validate(file_type, content):
+            print(f"Local validation passed for {file_path}. Skipping API syntax check.")
+            return content, None
+
+        cached_result = get_cached_response(self._syntax_cache_key(file_type, content))
+        if cached_result is not None:
+            print(f"Using cached syntax check result for {file_path}")
+            return self._process_result(cached_result, file_path, content, file_type, conversion_report)
+
+        try:
+            print(f"Sending to Claude API for syntax checking...")
+
+            result = self._stream_response(system_prompt, user_prompt, content)
+            print(f"Claude API response received for {file_path}")
+
+            store_response(self._syntax_cache_key(file_type, content), result)
+            return self._process_result(result, file_path, content, file_type, conversion_report)
+
+        except Exception as e:
+            print(f"Claude API error during syntax check for {file_path}: {str(e)}")
+            # Retry with exponential backoff and jitter, honoring any
+            # Retry-After header the API returned
+            for attempt in range(1, self.max_retries):
+                delay = backoff_delay(attempt - 1, e)
+                print(f"Retrying syntax check in {delay:.1f} seconds... (Attempt {attempt}/{self.max_retries - 1})")
+                time.sleep(delay)
+                try:
+                    result = self._stream_response(system_prompt, user_prompt, content)
+                    store_response(self._syntax_cache_key(file_type, content), result)
+                    return self._process_result(result, file_path, content, file_type, conversion_report)
+                except Exception as retry_error:
+                    e = retry_error
+                    print(f"Retry failed: {str(retry_error)}")
+
+            return content, None
+
+    def _stream_response(self, system_prompt: str, user_prompt: str, content: str) -> str:
+        # Stream the response so decoding overlaps with accumulation, and so
+        # the common all-clear answer can short-circuit the download
+        chunks = []
+        with self.anthropic_client.messages.stream(
+            model=self.model,
+            max_tokens=self._estimate_max_tokens(content),
+            system=self._build_system_param(system_prompt),
+            messages=[
+                {"role": "user", "content": user_prompt}
+            ],
+            temperature=0.2
+        ) as stream:
+            for text in stream.text_stream:
+                chunks.append(text)
+                if self._is_early_valid(''.join(chunks)):
+                    return '{"status": "valid"}'
+        return ''.join(chunks).strip()
+
+    async def _stream_response_async(self, system_prompt: str, user_prompt: str, content: str) -> str:
+        chunks = []
+        async with self.async_client.messages.stream(
+            model=self.model,
+            max_tokens=self._estimate_max_tokens(content),
+            system=self._build_system_param(system_prompt),
+            messages=[
+                {"role": "user", "content": user_prompt}
+            ],
+            temperature=0.2
+        ) as stream:
+            async for text in stream.text_stream:
+                chunks.append(text)
+                if self._is_early_valid(''.join(chunks)):
+                    return '{"status": "valid"}'
+        return ''.join(chunks).strip()
+
+    @staticmethod
+    def _is_early_valid(accumulated: str) -> bool:
+        # The status field comes first, so once it reads "valid" the verdict
+        # is in and the rest of the response doesn't need draining
+        condensed = ''.join(accumulated.split())
+        return condensed.startswith('{"status":"valid"')
+
+    def enqueue(self, file_path: Path, content: str) -> None:
+        """Queue a file for the batched syntax check performed by flush()."""
+        self._pending.append((file_path, content))
+
+    def flush(self, conversion_report: ConversionReport) -> dict:
+        """Check all queued files and return {str(path): (content, corrections)}.
+
+        Locally valid and cached files are resolved without API traffic;
+        everything else goes out as a single Message Batch.
+        """
+        pending, self._pending = self._pending, []
+        if not pending:
+            return {}
+
+        results = {}
+        needs_api = []
+        for file_path, content in pending:
+            if not isinstance(content, str):
+                print(f"Warning: content is not a string. Type: {type(content)}")
+                content = str(content) if content is not None else ""
+
+            file_type = self._get_file_type(file_path)
+            if self._local_validate(file_type, content):
+                print(f"Local validation passed for {file_path}. Skipping API syntax check.")
+                results[str(file_path)] = (content, None)
+                continue
+
+            cached_result = get_cached_response(self._syntax_cache_key(file_type, content))
+            if cached_result is not None:
+                print(f"Using cached syntax check result for {file_path}")
+                results[str(file_path)] = self._process_result(cached_result, file_path, content, file_type, conversion_report)
+                continue
+
+            needs_api.append((file_path, content, file_type))
+
+        if not needs_api:
+            return results
+
+        if len(needs_api) < 2:
+            # A batch of one gains nothing; check it inline
+            for file_path, content, _ in needs_api:
+                results[str(file_path)] = self.check_and_correct_syntax(file_path, content, conversion_report)
+            return results
+
+        results.update(self._check_batch(needs_api, conversion_report))
+        return results
+
+    def _check_batch(self, needs_api: list, conversion_report: ConversionReport) -> dict:
+        print(f"Submitting {len(needs_api)} syntax checks as a single Message Batch...")
+        batch_requests = [
+            {
+                # Paths aren't valid custom_ids, so key on the list index
+                "custom_id": f"check-{index}",
+                "params": {
+                    "model": self.model,
+                    "max_tokens": self._estimate_max_tokens(content),
+                    # Batches can take longer than the default 5-minute cache
+                    # window, so pin the cached prompt for an hour
+                    "system": self._build_system_param(self._get_system_prompt(file_type), ttl="1h"),
+                    "messages": [
+                        {"role": "user", "content": self._get_user_prompt(file_type, content)}
+                    ],
+                    "temperature": 0.2
+                }
+            }
+            for index, (file_path, content, file_type) in enumerate(needs_api)
+        ]
+
+        try:
+            batch = self.anthropic_client.messages.batches.create(requests=batch_requests)
+        except Exception as e:
+            print(f"Error submitting syntax check batch: {str(e)}. Falling back to concurrent checks.")
+            items = [(file_path, content) for file_path, content, _ in needs_api]
+            checked = asyncio.run(self.check_files_concurrently(items, conversion_report))
+            return {str(file_path): result for (file_path, _, _), result in zip(needs_api, checked)}
+
+        print(f"Batch {batch.id} submitted. Waiting for processing to finish...")
+        while batch.processing_status != "ended":
+            time.sleep(self.batch_poll_interval)
+            batch = self.anthropic_client.messages.batches.retrieve(batch.id)
+
+        results = {}
+        for batch_result in self.anthropic_client.messages.batches.results(batch.id):
+            index = int(batch_result.custom_id.rsplit('-', 1)[-1])
+            file_path, content, file_type = needs_api[index]
+
+            if batch_result.result.type != "succeeded":
+                print(f"Syntax check for {file_path} failed: batch result was '{batch_result.result.type}'")
+                results[str(file_path)] = (content, None)
+                continue
+
+            result = batch_result.result.message.content[0].text.strip()
+            store_response(self._syntax_cache_key(file_type, content), result)
+            results[str(file_path)] = self._process_result(result, file_path, content, file_type, conversion_report)
+
+        # Keep the original content for anything the batch didn't return
+        for file_path, content, _ in needs_api:
+            results.setdefault(str(file_path), (content, None))
+        return results
+
+    def _local_validate(self, file_type: str, content: str) -> bool:
+        """Cheap local validation; True means the API check can be skipped."""
+        if file_type == 'json':
+            try:
+                json.loads(content)
+                return True
+            except json.JSONDecodeError:
+                return False
+        if file_type == 'sqlx':
+            return self._local_validate_sqlx(content)
+        return False
+
+    def _local_validate_sqlx(self, content: str) -> bool:
+        stripped = content.strip()
+        if not stripped.startswith('config'):
+            return False
+
+        config_block, remaining_sql = self._split_config_block(stripped)
+        if config_block is None:
+            # Config block never closes
+            return False
+        if not remaining_sql.strip():
+            # No SQL after the config block
+            return False
+        # Leftover Jinja means the rule-based conversion missed something
+        if '{{' in content or '{%' in content:
+            return False
+        # An odd number of backticks usually means a broken template literal
+        if content.count('`') % 2 != 0:
+            return False
+        return True
+
+    def _split_config_block(self, content: str) -> tuple:
+        brace_start = content.find('{')
+        if brace_start == -1:
+            return None, content
+        depth = 0
+        for i, char in enumerate(content[brace_start:], start=brace_start):
+            if char == '{':
+                depth += 1
+            elif char == '}':
+                depth -= 1
+                if depth == 0:
+                    return content[brace_start:i + 1], content[i + 1:]
+        return None, content
+
+    def _syntax_cache_key(self, file_type: str, content: str) -> tuple:
+        return ("syntax_check", self.model, file_type, content)
+
+    def _process_result(self, result: str, file_path: Path, content: str, file_type: str, conversion_report: ConversionReport) -> tuple:
+        try:
+            parsed = json.loads(result)
+        except json.JSONDecodeError:
+            print(f"Warning: could not parse syntax check response for {file_path} as JSON. Keeping original content.")
+            return content, None
+
+        if parsed.get("status") == "valid":
+            print(f"No syntax corrections needed for {file_path}")
+            return content, None
+
+        corrected_code = parsed.get("code", "")
+        explanation = parsed.get("explanation", "")
+        conversion_report.add_issue(
+            str(file_path),
+            "Syntax Correction",
+            f"The following changes were made: {explanation or 'see corrected file'}"
+        )
+        print(f"Syntax corrections made for {file_path}")
+        return corrected_code if corrected_code else content, explanation or result
+
+    async def check_and_correct_syntax_async(self, file_path: Path, content: str, conversion_report: ConversionReport) -> tuple:
+        print(f"Checking syntax for file: {file_path}")
+
+        if not self.anthropic_api_key:
+            print("Anthropic API key not provided. Skipping syntax check.")
+            return content, None
+
+        if not isinstance(content, str):
+            print(f"Warning: content is not a string. Type: {type(content)}")
+            return str(content) if content is not None else "", None
+
+        file_type = self._get_file_type(file_path)
+        system_prompt = self._get_system_prompt(file_type)
+        user_prompt = self._get_user_prompt(file_type, content)
+
+        if self._local_validate(file_type, content):
+            print(f"Local validation passed for {file_path}. Skipping API syntax check.")
+            return content, None
+
+        cached_result = get_cached_response(self._syntax_cache_key(file_type, content))
+        if cached_result is not None:
+            print(f"Using cached syntax check result for {file_path}")
+            return self._process_result(cached_result, file_path, content, file_type, conversion_report)
+
+        try:
+            print(f"Sending to Claude API for syntax checking...")
+
+            result = await self._stream_response_async(system_prompt, user_prompt, content)
+            print(f"Claude API response received for {file_path}")
+
+            store_response(self._syntax_cache_key(file_type, content), result)
+            return self._process_result(result, file_path, content, file_type, conversion_report)
+
+        except Exception as e:
+            print(f"Claude API error during syntax check for {file_path}: {str(e)}")
+            # Retry with exponential backoff and jitter, honoring any
+            # Retry-After header the API returned
+            for attempt in range(1, self.max_retries):
+                delay = backoff_delay(attempt - 1, e)
+                print(f"Retrying syntax check in {delay:.1f} seconds... (Attempt {attempt}/{self.max_retries - 1})")
+                await asyncio.sleep(delay)
+                try:
+                    result = await self._stream_response_async(system_prompt, user_prompt, content)
+                    store_response(self._syntax_cache_key(file_type, content), result)
+                    return self._process_result(result, file_path, content, file_type, conversion_report)
+                except Exception as retry_error:
+                    e = retry_error
+                    print(f"Retry failed: {str(retry_error)}")
+
+            return content, None
+
+    async def check_files_concurrently(self, items: list, conversion_report: ConversionReport, max_concurrency: int = 10) -> list:
+        """Check several (file_path, content) pairs at once, capped by a semaphore.
+
+        Returns a list of (corrected_content, corrections) tuples in the same
+        order as the input items.
+        """
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def _bounded_check(file_path, content):
+            async with semaphore:
+                return await self.check_and_correct_syntax_async(file_path, content, conversion_report)
+
+        return await asyncio.gather(*[_bounded_check(file_path, content) for file_path, content in items])
+
+    def _build_system_param(self, system_prompt: str, ttl: str = None) -> list:
+        # Mark the static system prompt as cacheable so repeated checks hit
+        # the server-side prefix cache instead of re-prefilling it every call
+        cache_control = {"type": "ephemeral"}
+        if ttl:
+            cache_control["ttl"] = ttl
+        return [{"type": "text", "text": system_prompt, "cache_control": cache_control}]
+
+    def _estimate_max_tokens(self, content: str) -> int:
+        # Anthropic reserves budget proportional to max_tokens, so a flat 64k
+        # reservation inflates queue time for every check. A corrected file is
+        # about the size of the input, so scale with it and keep a floor for
+        # the explanation text.
+        return min(64000, max(8192, 4 * len(content.split())))
+
+    def _get_file_type(self, file_path: Path) -> str:
+        if file_path.suffix == '.sqlx':
+            return 'sqlx'
+        elif file_path.name == 'dataform.json':
+            return 'json'
+        else:
+            return 'unknown'
+
+    @staticmethod
+    @functools.lru_cache(maxsize=4)
+    def _get_system_prompt(file_type: str) -> str:
+        if file_type == 'sqlx':
+            return _SQLX_SYSTEM_PROMPT
+        elif file_type == 'json':
+            return _JSON_SYSTEM_PROMPT
+        else:
+            return _DEFAULT_SYSTEM_PROMPT
+
     def _get_user_prompt(self, file_type: str, content: str) -> str:
+        # The template is cached per file type; only the content is
+        # interpolated at call time
+        return self._get_user_prompt_template(file_type).format(content=content)
+
+    @staticmethod
+    @functools.lru_cache(maxsize=4)
+    def _get_user_prompt_template(file_type: str) -> str:
         if file_type == 'sqlx':
-            return f"""
-            Check if the following Dataform SQLX code is valid. If it's not valid, correct it and explain the changes made.
-            If it's valid, just respond with "Valid".
+            return """
+            Check if the following Dataform SQLX code is valid.
 
-            Always include the full corrected code in your response, even if only small changes were made.
-            Wrap the corrected code in ```sqlx and ``` tags.
+            Respond with a single JSON object and no other text: {{"status": "valid"}} if it is valid, or
+            {{"status": "corrected", "code": "...", "explanation": "..."}} if it is not.
+            Always include the full corrected code in the "code" field, even if only small changes were made.
 
             Code:
             {content}
             """
         elif file_type == 'json':
-            return f"""
-            Check if the following dataform.json configuration is valid. If it's not valid, correct it and explain the changes made.
-            If it's valid, just respond with "Valid".
+            return """
+            Check if the following dataform.json configuration is valid.
 
-            Always include the full corrected JSON in your response, even if only small changes were made.
-            Wrap the corrected JSON in ```json and ``` tags.
+            Respond with a single JSON object and no other text: {{"status": "valid"}} if it is valid, or
+            {{"status": "corrected", "code": "...", "explanation": "..."}} if it is not.
+            Always include the full corrected JSON in the "code" field, even if only small changes were made.
 
             JSON:
             {content}
             """
         else:
-            return f"Unknown file type. Please check the content:\n\n{content}"
-
-    def _extract_corrected_code(self, result: str, file_type: str) -> str:
-        if file_type == 'sqlx':
-            sqlx_code_blocks = re.findall(r'```sqlx(.*?)```', result, re.DOTALL)
-            if sqlx_code_blocks:
-                return sqlx_code_blocks[-1].strip()
-            
-            # Fallback to general code blocks
-            code_blocks = re.findall(r'```(.*?)```', result, re.DOTALL)
-            if code_blocks:
-                return code_blocks[-1].strip()
-                
-        elif file_type == 'json':
-            json_code_blocks = re.findall(r'```json(.*?)```', result, re.DOTALL)
-            if json_code_blocks:
-                try:
-                    # Attempt to parse the JSON to ensure it's valid
-                    json_content = json_code_blocks[-1].strip()
-                    json.loads(json_content)  # Just to validate
-                    return json_content
-                except json.JSONDecodeError:
-                    print("Warning: Extracted JSON is not valid.")
-                    
-            # Fallback to general code blocks
-            code_blocks = re.findall(r'```(.*?)```', result, re.DOTALL)
-            if code_blocks:
-                try:
-                    json_content = code_blocks[-1].strip()
-                    json.loads(json_content)  # Just to validate
-                    return json_content
-                except (json.JSONDecodeError, IndexError):
-                    print("Warning: No valid JSON found in code blocks.")
-
-        # More general extractions if the code blocks aren't found
-        corrected_code_match = re.search(r'(?:Corrected|Fixed|Updated) (?:code|version):\s*(.*)', result, re.DOTALL | re.IGNORECASE)
-        if corrected_code_match:
-            return corrected_code_match.group(1).strip()
-
-        # Last resort: look for code-like patterns
-        lines = result.split('\n')
-        if file_type == 'sqlx':
-            for i, line in enumerate(lines):
-                if line.strip().endswith('{') or line.strip().startswith('config') or 'SELECT' in line.upper():
-                    return '\n'.join(lines[i:]).strip()
-        elif file_type == 'json':
-            for i, line in enumerate(lines):
-                if line.strip().startswith('{'):
-                    try:
-                        potential_json = '\n'.join(lines[i:]).strip()
-                        json.loads(potential_json)  # Just to validate
-                        return potential_json
-                    except json.JSONDecodeError:
-                        continue
-
-        # If we couldn't extract anything meaningful, return empty string
-        print("Warning: Could not extract corrected code from Claude's response.")
-        return ""
\ No newline at end of file
+            return "Unknown file type. Please check the content and respond with a single JSON object ({{\"status\": \"valid\"}} or {{\"status\": \"corrected\", \"code\": \"...\", \"explanation\": \"...\"}}):\n\n{content}"
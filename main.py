@@ -6,6 +6,9 @@ import yaml
 import traceback
 import sys
 import shutil
+import httpx
+from concurrent.futures import ProcessPoolExecutor
+from anthropic import Anthropic
 
 
 from dbt_to_dataform.repository_analyzer import RepositoryAnalyzer
@@ -28,7 +31,19 @@ def main(dbt_repo_path: str, output_path: str, anthropic_api_key: str = None, ve
     artifacts = analyzer.analyze()
     dbt_config = analyzer.get_project_config()
     conversion_report = ConversionReport(Path(output_path))
-    syntax_checker = SyntaxChecker(anthropic_api_key) if anthropic_api_key else None
+
+    # One shared client for every Anthropic call in the run, so the macro
+    # converter and syntax checker reuse the same connection pool
+    anthropic_client = None
+    if anthropic_api_key:
+        http_client = httpx.Client(
+            timeout=None,
+            follow_redirects=True,
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=20)
+        )
+        anthropic_client = Anthropic(api_key=anthropic_api_key, http_client=http_client)
+
+    syntax_checker = SyntaxChecker(anthropic_api_key, anthropic_client=anthropic_client) if anthropic_api_key else None
 
     # Extract project variables
     project_variables = dbt_config.get('vars', {})
@@ -60,10 +75,11 @@ def main(dbt_repo_path: str, output_path: str, anthropic_api_key: str = None, ve
     source_converter = SourceConverter(Path(dbt_repo_path), Path(output_path))
     source_tables = source_converter.convert_sources()
     
+    macro_converter = None
     if anthropic_api_key:
         print("Converting macros using Claude API...")
         try:
-            macro_converter = MacroConverter(anthropic_api_key)
+            macro_converter = MacroConverter(anthropic_api_key, anthropic_client=anthropic_client)
             macro_converter.convert_macros(dbt_repo_path, output_path)
         except Exception as e:
             print(f"Error during macro conversion: {str(e)}")
@@ -78,9 +94,20 @@ def main(dbt_repo_path: str, output_path: str, anthropic_api_key: str = None, ve
     print("Converting models...")
     model_converter = ModelConverter(project_variables, dbt_models_dir, source_tables)
 
-    for model_path in artifacts['models']:
+    # First pass: convert every model in memory and collect the results so the
+    # syntax checks can run concurrently instead of one API call per model.
+    # convert_model is pure CPU (regex rewriting), so fan it out across cores;
+    # directory creation and API checks stay in this process.
+    model_paths = list(artifacts['models'])
+    if len(model_paths) > 1:
+        with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+            conversion_results = list(executor.map(model_converter.convert_model, model_paths))
+    else:
+        conversion_results = [model_converter.convert_model(model_path) for model_path in model_paths]
+
+    converted_models = []
+    for model_path, (sqlx_content, output_dir, output_file) in zip(model_paths, conversion_results):
         try:
-            sqlx_content, output_dir, output_file = model_converter.convert_model(model_path)
             if sqlx_content is None or output_dir is None or output_file is None:
                 print(f"Skipping model due to conversion error: {model_path}")
                 continue
@@ -89,46 +116,12 @@ def main(dbt_repo_path: str, output_path: str, anthropic_api_key: str = None, ve
             output_model_path.mkdir(parents=True, exist_ok=True)
             output_file_path = output_model_path / output_file
 
-            
+
             # Adjust source references
             #sqlx_content = re.sub(r'\$\{ref\([\'"](\w+)[\'"]\)\}', lambda m: f"${{ref('source_{m.group(1)}')}}", sqlx_content)
 
             print(f"Converting model: {model_path.relative_to(dbt_models_dir)} to {output_file_path}")
-
-            # Check and correct syntax if Anthropic API key is provided
-            if syntax_checker:
-                print(f"Performing syntax check for {output_file_path}")
-                try:
-                    sqlx_content, corrections = syntax_checker.check_and_correct_syntax(output_file_path, sqlx_content, conversion_report)
-                    if verbose and corrections:
-                        print(f"Syntax corrections for {output_file_path}:")
-                        print(corrections)
-                except Exception as e:
-                    print(f"Error during syntax check for {output_file_path}: {str(e)}")
-                    print("Continuing with unconverted content...")
-            else:
-                print("Syntax checker not available. Skipping syntax check.")
-
-            if not isinstance(sqlx_content, str):
-                print(f"Warning: sqlx_content is not a string. Type: {type(sqlx_content)}")
-                sqlx_content = str(sqlx_content) if sqlx_content is not None else ""
-
-            print(f"Writing content to {output_file_path}")
-            output_file_path.write_text(sqlx_content)
-
-            # Check for potential issues
-            if "-- TODO:" in sqlx_content:
-                conversion_report.add_issue(
-                    str(model_path),
-                    "Incomplete Conversion",
-                    "This model contains TODO comments indicating manual review is needed."
-                )
-            if "dbt_utils" in sqlx_content:
-                conversion_report.add_issue(
-                    str(model_path),
-                    "Unconverted dbt_utils Reference",
-                    "This model still contains references to dbt_utils that couldn't be automatically converted."
-                )
+            converted_models.append((model_path, output_file_path, sqlx_content))
         except Exception as e:
             print(f"Error converting model: {model_path.relative_to(dbt_models_dir)}")
             print(f"Error message: {str(e)}")
@@ -141,8 +134,17 @@ def main(dbt_repo_path: str, output_path: str, anthropic_api_key: str = None, ve
                 f"Error occurred during conversion: {str(e)}"
             )
 
+    # Queue every model for the syntax check batch that runs after metadata
+    # conversion, so the whole run costs one Message Batch
+    if syntax_checker:
+        for _, output_file_path, sqlx_content in converted_models:
+            syntax_checker.enqueue(output_file_path, sqlx_content)
+    else:
+        print("Syntax checker not available. Skipping syntax check.")
+
     print("Converting metadata...")
     metadata_converter = MetadataConverter()
+    converted_metadata = []
     for yaml_path in artifacts['yaml_files']:
         if yaml_path.name == 'schema.yml':
             try:
@@ -154,16 +156,8 @@ def main(dbt_repo_path: str, output_path: str, anthropic_api_key: str = None, ve
                 dataform_sqlx = metadata_converter.convert_schema_yml(yaml_path)
                 if dataform_sqlx:
                     if syntax_checker:
-                        print(f"Performing syntax check for metadata: {output_def_path}")
-                        try:
-                            dataform_sqlx, corrections = syntax_checker.check_and_correct_syntax(output_def_path, dataform_sqlx, conversion_report)
-                            if verbose and corrections:
-                                print(f"Syntax corrections for {output_def_path}:")
-                                print(corrections)
-                        except Exception as e:
-                            print(f"Error during syntax check for metadata: {output_def_path}: {str(e)}")
-                            print("Continuing with unconverted content...")
-                    output_def_path.write_text(dataform_sqlx)
+                        syntax_checker.enqueue(output_def_path, dataform_sqlx)
+                    converted_metadata.append((output_def_path, dataform_sqlx))
                 else:
                     print(f"Skipping empty or invalid schema file: {yaml_path}")
             except Exception as e:
@@ -173,7 +167,59 @@ def main(dbt_repo_path: str, output_path: str, anthropic_api_key: str = None, ve
                 traceback.print_exc()
                 print("Skipping this metadata file and continuing with the next...")
 
-    if anthropic_api_key and 'macro_converter' in locals() and macro_converter:
+    # Run all queued syntax checks as one Message Batch
+    checked_contents = {}
+    if syntax_checker:
+        print("Running batched syntax checks...")
+        try:
+            checked_contents = syntax_checker.flush(conversion_report)
+        except Exception as e:
+            print(f"Error during batched syntax checks: {str(e)}")
+            print("Continuing with unchecked content...")
+
+    # Final pass: write the (possibly corrected) content and flag issues
+    for model_path, output_file_path, sqlx_content in converted_models:
+        sqlx_content, corrections = checked_contents.get(str(output_file_path), (sqlx_content, None))
+        if verbose and corrections:
+            print(f"Syntax corrections for {output_file_path}:")
+            print(corrections)
+
+        if not isinstance(sqlx_content, str):
+            print(f"Warning: sqlx_content is not a string. Type: {type(sqlx_content)}")
+            sqlx_content = str(sqlx_content) if sqlx_content is not None else ""
+
+        print(f"Writing content to {output_file_path}")
+        output_file_path.write_text(sqlx_content)
+
+        # Rewrite macro references while the content is still in memory, so
+        # the directory-wide pass below can skip re-reading this file
+        if macro_converter:
+            macro_converter.update_references_in_content(output_file_path, sqlx_content)
+
+        # Check for potential issues
+        if "-- TODO:" in sqlx_content:
+            conversion_report.add_issue(
+                str(model_path),
+                "Incomplete Conversion",
+                "This model contains TODO comments indicating manual review is needed."
+            )
+        if "dbt_utils" in sqlx_content:
+            conversion_report.add_issue(
+                str(model_path),
+                "Unconverted dbt_utils Reference",
+                "This model still contains references to dbt_utils that couldn't be automatically converted."
+            )
+
+    for output_def_path, dataform_sqlx in converted_metadata:
+        dataform_sqlx, corrections = checked_contents.get(str(output_def_path), (dataform_sqlx, None))
+        if verbose and corrections:
+            print(f"Syntax corrections for {output_def_path}:")
+            print(corrections)
+        output_def_path.write_text(dataform_sqlx)
+        if macro_converter:
+            macro_converter.update_references_in_content(output_def_path, dataform_sqlx)
+
+    if macro_converter:
         print("Updating macro references...")
         try:
             macro_converter.update_macro_references(output_path)